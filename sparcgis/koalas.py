@@ -1,30 +1,29 @@
 import datetime
+import functools
+import itertools
+import json
 
 import numpy as np
 import pandas as pd
 
-import arcgis
-from arcgis.features import (
-    Feature,
-    FeatureSet,
-    FeatureLayer,
-    FeatureCollection,
-    FeatureLayerCollection,
-)
-from arcgis.geometry import (
-    Point,
-    MultiPoint,
-    Polyline,
-    Polygon,
-    SpatialReference,
-)
-
 import databricks.koalas as ks
 from databricks.koalas.extensions import (
     register_dataframe_accessor,
     register_series_accessor,
     register_index_accessor,
 )
+from pyspark.sql import functions as F
+from pyspark.sql.types import StringType, TimestampType
+
+try:
+    from numba import njit, prange
+except ImportError:  # numba is optional - fall back to numpy for coordinate packing
+    njit = None
+
+try:
+    import orjson
+except ImportError:  # orjson is optional - fall back to the stdlib json module
+    orjson = None
 
 
 @register_dataframe_accessor("spatial")
@@ -55,20 +54,21 @@ class KoalasGeoAccessor:
         self.geom_type = None
         self.spatial_reference = None
 
-    def __feature_set__(self):
+    def __feature_set__(self, engine="python"):
         """
         Returns a dict representation of a FeatureSet for self.obj
+        engine selects how point coordinates are packed: "python" (default) or "numba" (opt-in,
+        requires numba), or "spark" to build features on the executors
         """
+        if engine != "spark":
+            _get_pack_kernel(engine)  # fail fast on an unusable engine before collecting
+
         if self.geom_type is None:
             raise ValueError(
                 "Geometry type must be specified as one of ",
                 " [Point, Multipoint, Polyline, Polygon]: set with df.spatial.geometry(geom_type)",
             )
 
-        cols_norm = list(self.obj.columns)
-        cols_lower = [col.lower() for col in self.obj.columns]
-        fields, features, date_fields = [], [], []
-
         if self.spatial_reference is None:
             self.sr()
 
@@ -82,23 +82,88 @@ class KoalasGeoAccessor:
             "features": [],
         }
 
-        sub = self.obj.select_dtypes(include=[float, int, complex])
-        self.obj[sub.columns.to_list()] = sub.fillna(0)
+        if engine == "spark":
+            return self._spark_feature_set(fset)
+
+        # collect to pandas once - everything below works on the local frame
+        pdf = self.obj.to_pandas()
+
+        # fill missing numeric values locally rather than writing back to self.obj,
+        # which would kick off a distributed job and mutate the caller's dataframe
+        num_cols = pdf.select_dtypes(include=[np.number]).columns
+        pdf[num_cols] = pdf[num_cols].fillna(0)
+
+        # spark integer columns with nulls come back from to_pandas() as float64 - once
+        # the nulls are filled, restore the koalas dtypes so fields and values follow the
+        # same schema as the spark engine, which reads them from self.obj
+        kdtypes = self.obj.dtypes
+        pdf = pdf.astype(
+            {
+                c: kdtypes[c]
+                for c in pdf.columns
+                if kdtypes[c].kind in "iu" and pdf[c].dtype != kdtypes[c]
+            }
+        )
+
+        # string lengths are computed locally up front instead of running a
+        # distributed .str.len().max() scan per string column
+        str_lens = _string_lengths(pdf)
 
-        # create esri fields for each column in the dataframe
-        fset["fields"] = [_create_field(self.obj, col) for col in cols_norm]
+        # create esri fields for each column from the collected frame - dtypes are
+        # unchanged by the fill, and any value sampling stays local
+        fset["fields"] = [
+            _create_field(pdf, col, str_len=str_lens.get(col)) for col in pdf.columns
+        ]
 
         typemap = {
-            "esriGeometryPoint": _create_point_feature,
             "esriGeometryPolyline": _create_polyline_feature,  # TODO
             "esriGeometryPolygon": _create_polygon_feature,  # TODO
             "esriGeometryMultipoint": _create_multipoint_feature,  # TODO
         }
 
-        fset["features"] = [
-            typemap[self.geom_type](r, sr=self.spatial_reference)
-            for r in self.obj.to_dict("records")
+        if self.geom_type == "esriGeometryPoint":
+            # points are column-wise: work from a column-major intermediate and
+            # only flatten to esri's row-major features list at the very end
+            # attribute columns are resolved once rather than filtered per row
+            attr_cols = _point_attr_cols(pdf.columns)
+            cols = _point_columns(pdf, attr_cols)
+            fset["features"] = _features_from_columns(
+                _pack_coordinates(cols["x"], cols["y"], engine=engine),
+                self.spatial_reference,
+                cols["attributes"],
+                attr_cols,
+            )
+        else:
+            # geometry type and spatial reference are loop-invariant: bind them once
+            make_feature = functools.partial(
+                typemap[self.geom_type], sr=self.spatial_reference
+            )
+            fset["features"] = [make_feature(r) for r in pdf.to_dict("records")]
+        return fset
+
+    def _spark_feature_set(self, fset):
+        """
+        Fills in fields and features for fset using Spark, mapping over partitions
+        so feature dicts are built on the executors instead of the driver
+        """
+        if self.geom_type != "esriGeometryPoint":
+            raise NotImplementedError("engine='spark' only supports Point geometries")
+
+        sdf = self.obj.to_spark()
+        num_cols = [c for c in self.obj.columns if self.obj[c].dtype.kind in "iufc"]
+        sdf = sdf.fillna(0, subset=num_cols)
+        # coordinates are packed as floats in the pandas path whatever the source dtype
+        sdf = sdf.withColumn("x", sdf["x"].cast("double"))
+        sdf = sdf.withColumn("y", sdf["y"].cast("double"))
+
+        str_lens = _spark_string_lengths(sdf)
+        fset["fields"] = [
+            _create_field(self.obj, col, str_len=str_lens.get(col))
+            for col in self.obj.columns
         ]
+
+        attr_cols = _point_attr_cols(sdf.columns)
+        fset["features"] = _spark_point_features(sdf, self.spatial_reference, attr_cols)
         return fset
 
     def sr(self, sr=None):
@@ -106,14 +171,15 @@ class KoalasGeoAccessor:
         Set the spatial reference for the dataset - defaults to 4326
         returns DataFrame object
         """
+        from arcgis.geometry import SpatialReference
+
         default_sr = {"wkid": 4326}
         if sr is None:
-            self.spatial_reference = SpatialReference(default_sr)
+            self.spatial_reference = _sr_from_wkid(default_sr["wkid"])
         elif isinstance(sr, SpatialReference):
             self.spatial_reference = SpatialReference(sr)
         elif isinstance(sr, int):
-            default_sr["wkid"] = sr
-            self.spatial_reference = SpatialReference(default_sr)
+            self.spatial_reference = _sr_from_wkid(sr)
         elif isinstance(sr, dict):
             if "spatialReference" in sr.keys():
                 if (
@@ -127,9 +193,7 @@ class KoalasGeoAccessor:
                     )
         elif isinstance(sr, str):
             try:
-                sr = int(sr)
-                default_sr["wkid"] = sr
-                self.spatial_reference = SpatialReference(default_sr)
+                self.spatial_reference = _sr_from_wkid(int(sr))
             except:
                 raise ValueError(
                     "Cannot interpret spatial reference: pass an EPSG code, SpatialReference ",
@@ -157,45 +221,142 @@ class KoalasGeoAccessor:
         """
         raise NotImplementedError
 
-    def to_dict(self):
-        return self.__feature_set__()
+    def to_dict(self, engine="python"):
+        return self.__feature_set__(engine=engine)
 
-    def to_featureset(self):
-        return FeatureSet.from_dict(self.__feature_set__())
+    def to_featureset(self, engine="python"):
+        from arcgis.features import FeatureSet
 
+        return FeatureSet.from_dict(self.__feature_set__(engine=engine))
 
-def _get_geometry_type(t):
-    valid_types = {
+    def to_json(self, engine="python"):
+        """
+        Returns the esri JSON string representation of a FeatureSet for self.obj
+        serialized with orjson when it's installed
+        """
+        return _dumps(self.__feature_set__(engine=engine))
+
+
+def _json_default(obj):
+    """
+    Serializes values json doesn't natively handle - dates become epoch milliseconds
+    """
+    if isinstance(obj, (datetime.datetime, np.datetime64)):
+        if pd.isnull(obj):
+            return None
+        return pd.Timestamp(obj).value // 10 ** 6
+    elif isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
+
+
+def _dumps(obj):
+    """
+    Serializes obj to a JSON string, using orjson when it's installed
+    numpy scalars and datetimes are routed through _json_default by both serializers
+    (orjson would otherwise emit ISO strings for np.datetime64, and fails on NaT)
+    """
+    if orjson is not None:
+        return orjson.dumps(
+            obj, default=_json_default, option=orjson.OPT_PASSTHROUGH_DATETIME
+        ).decode("utf-8")
+    return json.dumps(obj, default=_json_default, separators=(",", ":"))
+
+
+def _sr_from_wkid(wkid):
+    """
+    Returns a new SpatialReference for an EPSG code - deliberately not memoized,
+    since SpatialReference is a mutable dict and callers may edit the one they get
+    """
+    from arcgis.geometry import SpatialReference
+
+    return SpatialReference({"wkid": wkid})
+
+
+@functools.lru_cache(maxsize=None)
+def _geometry_types():
+    """
+    Returns a mapping of arcgis.geometry types to their esri string representation
+    arcgis is imported lazily since importing it is slow
+    """
+    from arcgis.geometry import Point, MultiPoint, Polyline, Polygon
+
+    return {
         Point: "esriGeometryPoint",
         Polyline: "esriGeometryPolyline",
         MultiPoint: "esriGeometryMultipoint",
         Polygon: "esriGeometryPolygon",
     }
 
+
+def _get_geometry_type(t):
     try:
-        return valid_types[t]
+        return _geometry_types()[t]
     except KeyError:
         raise TypeError(
             f"Geometry type must be one of: Point, Polyline, Multipoint, Polygon, not {t}"
         )
 
 
-def _create_field(df, col):
+# ordered by precedence - the isinstance fallback in _get_esri_type walks it in order
+_ESRI_TYPE_MAP = {
+    str: "esriFieldTypeString",
+    np.str_: "esriFieldTypeString",
+    datetime.datetime: "esriFieldTypeDate",
+    pd.Timestamp: "esriFieldTypeDate",
+    np.datetime64: "esriFieldTypeDate",
+    np.int32: "esriFieldTypeSmallInteger",
+    np.int16: "esriFieldTypeSmallInteger",
+    np.int8: "esriFieldTypeSmallInteger",
+    int: "esriFieldTypeBigInteger",
+    np.int64: "esriFieldTypeBigInteger",
+    float: "esriFieldTypeDouble",
+    np.float64: "esriFieldTypeDouble",
+    np.float32: "esriFieldTypeSingle",
+}
+
+_ESRI_DTYPE_MAP = {
+    np.dtype("int8"): "esriFieldTypeSmallInteger",
+    np.dtype("int16"): "esriFieldTypeSmallInteger",
+    np.dtype("int32"): "esriFieldTypeSmallInteger",
+    np.dtype("int64"): "esriFieldTypeBigInteger",
+    np.dtype("float32"): "esriFieldTypeSingle",
+    np.dtype("float64"): "esriFieldTypeDouble",
+}
+
+
+def _create_field(df, col, str_len=None):
     """
     Creates an Esri field for a given column in a dataframe
+    str_len is the precomputed max length of a string column, computed from df if not given -
+    passing it also marks an object column as a string column, skipping the value sample
     TODO: see if adding support for pyspark.sql.types is needed
     TODO: add support for domain key
     """
     field = {"name": col, "alias": col}
 
-    try:
-        idx = df[col].first_valid_index()
-        val = df[col].loc[idx]
-    except:
-        val = ""
-
-    if isinstance(val, (str, np.str)):
-        l = df[col].str.len().max()
+    # the column dtype is enough to pick the esri type without touching any data,
+    # only ambiguous (e.g. object) dtypes fall back to sampling a value
+    dtype = df[col].dtype
+    if dtype.kind == "M":
+        esri_type = "esriFieldTypeDate"
+    else:
+        esri_type = _ESRI_DTYPE_MAP.get(dtype)
+
+    if esri_type is None and dtype.kind == "O" and str_len is not None:
+        esri_type = "esriFieldTypeString"
+    elif esri_type is None:
+        try:
+            idx = df[col].first_valid_index()
+            val = df[col].loc[idx]
+        except:
+            val = ""
+        esri_type = _get_esri_type(val)
+
+    field["type"] = esri_type
+
+    if esri_type == "esriFieldTypeString":
+        l = df[col].str.len().max() if str_len is None else str_len
         if str(l) == "nan":
             l = 255
 
@@ -205,78 +366,201 @@ def _create_field(df, col):
             except:
                 l = 255
 
-        field["type"] = "esriFieldTypeString"
         field["length"] = l
-        return field
-
-    elif isinstance(val, (datetime.datetime, pd.Timestamp, np.datetime64)):
-        field["type"] = "esriFieldTypeDate"
-        return field
 
-    elif isinstance(val, (np.int32, np.int16, np.int8)):
-        field["type"] = "esriFieldTypeSmallInteger"
-        return field
+    return field
 
-    elif isinstance(val, (int, np.int, np.int64)):
-        field["type"] = "esriFieldTypeBigInteger"
-        return field
 
-    elif isinstance(val, (float, np.float64)):
-        field["type"] = "esriFieldTypeDouble"
-        return field
+def _string_lengths(pdf):
+    """
+    Returns the max string length for each string column in a pandas dataframe
+    """
+    return {
+        col: pdf[col].str.len().max()
+        for col in pdf.select_dtypes(include=[object]).columns
+        if pd.api.types.infer_dtype(pdf[col], skipna=True) == "string"
+    }
 
-    elif isinstance(val, (np.float32)):
-        field["type"] = "esriFieldTypeSingle"
-        return field
 
-    else:
+def _get_esri_type(val):
+    """
+    Return the string representation of an esri field type for a value
+    """
+    try:
+        return _ESRI_TYPE_MAP[type(val)]
+    except KeyError:
+        # subclasses of supported types (e.g. bool) miss the exact type lookup
+        for t, esri_type in _ESRI_TYPE_MAP.items():
+            if isinstance(val, t):
+                return esri_type
         raise TypeError(f"Unsupported column type: {type(val)}")
 
 
-# TODO: _create_feature implementations
-def _create_point_feature(record, sr, x_col="x", y_col="y", geom_key=None, exclude=[]):
+# keys of an esri point geometry - never carried over into feature attributes
+_SHAPE_KEYS = frozenset(("x", "y", "spatialReference"))
+
+
+def _point_attr_cols(columns, geom_key=None, exclude=None):
     """
-    Create an esri point feature object from a record
+    Returns the columns that become attributes of a point feature
     """
-    feature = {}
-    if geom_key is not None:
-        feature["SHAPE"] = {
-            "x": record[geom_key][x_col],
-            "y": record[geom_key][y_col],
-            "spatialReference": sr,
-        }
-        feature["attributes"] = {
-            k: v
-            for k, v in record.items()
-            if k not in feature["SHAPE"].keys()
-            and k not in exclude
-        }
+    excl = frozenset(exclude or ()) | _SHAPE_KEYS | {"SHAPE", geom_key}
+    return tuple(c for c in columns if c not in excl)
+
+
+def _point_feature_flat(record, sr, attr_cols, x_col="x", y_col="y"):
+    """
+    Create an esri point feature object from a record with top-level x/y columns
+    """
+    return {
+        "SHAPE": {"x": record[x_col], "y": record[y_col], "spatialReference": sr},
+        "attributes": {k: record[k] for k in attr_cols},
+    }
+
+
+def _point_columns(pdf, attr_cols, x_col="x", y_col="y"):
+    """
+    Returns a column-major representation of point data in a pandas dataframe:
+    {"x": xs, "y": ys, "attributes": {col: values}}
+    """
+    return {
+        "x": pdf[x_col].to_numpy(dtype=np.float64),
+        "y": pdf[y_col].to_numpy(dtype=np.float64),
+        "attributes": {c: pdf[c].to_numpy() for c in attr_cols},
+    }
+
+
+def _column_values(arr):
+    """
+    Converts a numpy array to a list of values - numeric arrays are converted
+    to python scalars in a single C-level pass via tolist(), datetimes are boxed
+    as pd.Timestamp/pd.NaT the same way pandas does
+    """
+    if arr.dtype.kind in "biuf":
+        return arr.tolist()
+    elif arr.dtype.kind == "M":
+        return list(pd.DatetimeIndex(arr))
+    return list(arr)
+
+
+def _pack_xy_python(xs, ys, out):
+    out[:, 0] = xs
+    out[:, 1] = ys
+
+
+# opt-in numeric kernel for coordinate packing, compiled to native code by numba
+if njit is not None:
+
+    @njit(cache=True, parallel=True)
+    def _pack_xy_numba(xs, ys, out):
+        for i in prange(xs.size):
+            out[i, 0] = xs[i]
+            out[i, 1] = ys[i]
+
+
+else:
+    _pack_xy_numba = None
+
+
+def _get_pack_kernel(engine="python"):
+    """
+    Returns the coordinate packing kernel for an engine - one of "python" or "numba"
+    """
+    if engine == "python":
+        return _pack_xy_python
+    elif engine == "numba":
+        if _pack_xy_numba is None:
+            raise ImportError("engine='numba' requires numba to be installed")
+        return _pack_xy_numba
     else:
-        feature["SHAPE"] = {
-            "x": record[x_col],
-            "y": record[y_col],
-            "spatialReference": sr,
-        }
-        feature["attributes"] = {
-            k: v
-            for k, v in record.items()
-            if k not in feature["SHAPE"].keys() and k not in exclude
+        raise ValueError(f"engine must be one of: 'python', 'numba', not {engine}")
+
+
+def _pack_coordinates(xs, ys, engine="python"):
+    """
+    Packs x and y coordinate arrays into a single (N, 2) array
+    """
+    out = np.empty((xs.size, 2), dtype=np.result_type(xs, ys))
+    _get_pack_kernel(engine)(xs, ys, out)
+    return out
+
+
+def _features_from_columns(xy, sr, attr_arrays, attr_cols):
+    """
+    Flattens column-major point data into a list of esri point features
+    """
+    attr_cols = tuple(attr_cols)
+    values = [_column_values(attr_arrays[c]) for c in attr_cols]
+    rows = zip(*values) if values else itertools.repeat(())
+    # every SHAPE shares the one sr dict
+    return [
+        {
+            "SHAPE": {"x": x, "y": y, "spatialReference": sr},
+            "attributes": dict(zip(attr_cols, row)),
         }
-    return feature
+        for (x, y), row in zip(xy.tolist(), rows)
+    ]
 
 
-def _create_multipoint_feature(record):
+def _spark_string_lengths(sdf):
+    """
+    Returns the max string length for each string column in a Spark dataframe
+    computed in a single aggregation
+    """
+    cols = [f.name for f in sdf.schema.fields if isinstance(f.dataType, StringType)]
+    if not cols:
+        return {}
+    row = sdf.select([F.max(F.length(sdf[c])).alias(c) for c in cols]).first()
+    # all-null columns have no max - nan falls back to the default length in _create_field
+    return {c: float("nan") if l is None else l for c, l in row.asDict().items()}
+
+
+def _spark_point_features(sdf, sr, attr_cols):
+    """
+    Builds esri point features from a Spark dataframe on the executors and
+    collects the results - attr_cols are broadcast so they ship once per worker
+    """
+    sc = sdf.rdd.context
+    attr_cols_bc = sc.broadcast(tuple(attr_cols))
+    # spark hands timestamps back as datetime.datetime - box them like the pandas path
+    date_cols_bc = sc.broadcast(
+        tuple(
+            f.name
+            for f in sdf.schema.fields
+            if isinstance(f.dataType, TimestampType) and f.name in attr_cols
+        )
+    )
+
+    def build(rows):
+        attr_cols, date_cols = attr_cols_bc.value, date_cols_bc.value
+        for row in rows:
+            feature = _point_feature_flat(row, None, attr_cols)
+            attrs = feature["attributes"]
+            for c in date_cols:
+                attrs[c] = pd.NaT if attrs[c] is None else pd.Timestamp(attrs[c])
+            yield feature
+
+    features = sdf.rdd.mapPartitions(build).collect()
+    # the spatial reference is attached on the driver, so every SHAPE shares the accessor's
+    # SpatialReference like the pandas path does, and executors never need arcgis
+    for feature in features:
+        feature["SHAPE"]["spatialReference"] = sr
+    return features
+
+
+# TODO: _create_feature implementations
+def _create_multipoint_feature(record, sr):
     """
     Create an esri multipoint feature object from a record
     """
     raise NotImplementedError
 
 
-def _create_polyline_feature(record):
+def _create_polyline_feature(record, sr):
     raise NotImplementedError
 
 
-def _create_polygon_feature(record):
+def _create_polygon_feature(record, sr):
     raise NotImplementedError
 
 
@@ -295,7 +579,7 @@ def _create_polygon_feature(record):
 #     field = {
 #         "name": col,
 #         "alias": col,
-#         "type": _get_esri_type(val) # maps type(val) through dict
+#         "type": _get_esri_type(val)
 #     }
 
 #     if field["type"] == "esriFieldTypeString":
@@ -311,39 +595,3 @@ def _create_polygon_feature(record):
 #         field["length"] = l
 
 #     return field
-
-# supplemental function for _alt_create_fields, may be generally
-# useful later on since this is needed sometimes, but I feel a
-# little uneasy about the implementation, can't place why...
-# def _get_esri_type(val):
-#     """
-#     Return the string representation of an esri field type
-#     """
-#     esri_str = "esriFieldTypeString"
-#     esri_date = "esriFieldTypeDate"
-#     esri_small_int = "esriFieldTypeSmallInteger"
-#     esri_big_int = "esriFieldTypeBigInteger"
-#     esri_double = "esriFieldTypeDouble"
-#     esri_single = "esriFieldTypeSingle"
-
-#     typemap = {
-#         str: esri_str,
-#         np.str: esri_str,
-#         datetime.datetime: esri_date,
-#         pd.Timestamp: esri_date,
-#         np.datetime64: esri_date,
-#         np.int32: esri_small_int,
-#         np.int16: esri_small_int,
-#         np.int8: esri_small_int,
-#         int: esri_big_int,
-#         np.int: esri_big_int,
-#         np.int64: esri_big_int,
-#         float: esri_double,
-#         np.float64: esri_double,
-#         np.float32: esri_single
-#     }
-
-#     try:
-#         return typemap[type(val)]
-#     except KeyError:
-#       raise TypeError(f"Unsupported column type: {type(val)}")
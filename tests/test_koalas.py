@@ -82,7 +82,7 @@ def comprehensive_kdf():
             "npfloat64": [np.float64(random.uniform(-100, 100)) for _ in range(5)],
             "str": ["esri", "global", "geospatial", "intelligence", "cool"],
             "npstr": [
-                np.str(x)
+                np.str_(x)
                 for x in ["esri", "global", "geospatial", "intelligence", "cool"]
             ],
             "datetime": dates,
@@ -113,6 +113,23 @@ def test_sr(kdf):
     assert kdf.spatial.spatial_reference["wkid"] == 4326
 
 
+def test_sr_wkid(kdf):
+    from sparcgis.koalas import KoalasGeoAccessor
+
+    kdf.spatial.sr(3857)
+    assert kdf.spatial.spatial_reference["wkid"] == 3857
+    kdf.spatial.sr("3857")
+    assert kdf.spatial.spatial_reference["wkid"] == 3857
+
+    # edits to one accessor's spatial reference don't leak into later sr() calls
+    kdf.spatial.spatial_reference["latestWkid"] = 3857
+    kdf.spatial.sr(3857)
+    assert "latestWkid" not in kdf.spatial.spatial_reference
+
+    with pytest.raises(ValueError):
+        kdf.spatial.sr("web mercator")
+
+
 def test_fields(comprehensive_kdf):
     from sparcgis.koalas import KoalasGeoAccessor
 
@@ -143,7 +160,7 @@ def test_fields(comprehensive_kdf):
         pd.Timestamp,
         np.datetime64,
         str,
-        np.str,
+        np.str_,
         np.int32,
         int,
         np.int16,
@@ -151,7 +168,7 @@ def test_fields(comprehensive_kdf):
         float,
         np.float64,
         np.float32,
-        np.int,
+        np.int_,
         np.int64,
     )
 
@@ -161,8 +178,18 @@ def test_fields(comprehensive_kdf):
     assert all(list(map(lambda x: validate_field(x), fields)))
 
 
+def test_fields_precomputed_str_len(comprehensive_kdf):
+    pdf = comprehensive_kdf.to_pandas()
+    str_lens = sparcgis.koalas._string_lengths(pdf)
+    assert set(str_lens) == {"str", "npstr"}
+
+    field = sparcgis.koalas._create_field(pdf, "str", str_len=str_lens["str"])
+    assert field["type"] == "esriFieldTypeString"
+    assert field["length"] == len("intelligence")
+
+
 def test_to_dict(kdf):
-    # TODO: refactor - this test covers most of the _create_point_feature logic
+    # TODO: refactor - this test covers most of the point feature creation logic
     # a separate set of tests should cover the feature creation
     # TODO: equivalency check for FeatureSet.to_dict and kdf.spatial.to_dict
     from sparcgis.koalas import KoalasGeoAccessor
@@ -179,6 +206,70 @@ def test_to_dict(kdf):
     assert pt.is_valid()
 
 
+def test_to_dict_engine(kdf):
+    from sparcgis.koalas import KoalasGeoAccessor
+
+    d = kdf.spatial.geometry(Point).to_dict(engine="python")
+    assert d == kdf.spatial.to_dict()
+
+    with pytest.raises(ValueError):
+        kdf.spatial.to_dict(engine="cython")
+
+
+def test_to_dict_spark_engine():
+    from pyspark.sql import SparkSession
+    from sparcgis.koalas import KoalasGeoAccessor
+
+    # built from spark so "count" is a nullable LongType column - koalas reports it
+    # as int64 while to_pandas() upcasts it to float64
+    spark = SparkSession.builder.getOrCreate()
+    sdf = spark.createDataFrame(
+        [
+            (1, 4, "geography", datetime.datetime(2020, 1, 1), 10),
+            (2, 5, "place", datetime.datetime(2020, 6, 1), None),
+            (3, 6, None, None, 30),
+        ],
+        "x long, y long, names string, when timestamp, count long",
+    )
+    kdf = sdf.to_koalas()
+    kdf.spatial.sr().geometry(Point)
+
+    d = kdf.spatial.to_dict(engine="spark")
+    assert d == kdf.spatial.to_dict(engine="python")
+    assert isinstance(d["features"][0]["SHAPE"]["x"], float)
+    assert isinstance(d["features"][0]["SHAPE"]["spatialReference"], SpatialReference)
+    assert isinstance(d["features"][0]["attributes"]["when"], pd.Timestamp)
+
+    count = next(f for f in d["fields"] if f["name"] == "count")
+    assert count["type"] == "esriFieldTypeBigInteger"
+    assert d["features"][1]["attributes"]["count"] == 0
+    assert isinstance(d["features"][1]["attributes"]["count"], int)
+
+
+def test_to_dict_numba_engine(kdf):
+    pytest.importorskip("numba")
+    from sparcgis.koalas import KoalasGeoAccessor
+
+    kdf.spatial.geometry(Point)
+    assert kdf.spatial.to_dict(engine="numba") == kdf.spatial.to_dict(engine="python")
+
+
+def test_to_dict_numba_engine_missing(kdf, monkeypatch):
+    from sparcgis.koalas import KoalasGeoAccessor
+
+    monkeypatch.setattr(sparcgis.koalas, "_pack_xy_numba", None)
+    with pytest.raises(ImportError):
+        kdf.spatial.geometry(Point).to_dict(engine="numba")
+
+
+def test_to_dict_does_not_mutate(kdf):
+    from sparcgis.koalas import KoalasGeoAccessor
+
+    d = kdf.spatial.geometry(Point).to_dict()
+    assert kdf["x"].isnull().any()
+    assert d == kdf.spatial.to_dict()
+
+
 def test_to_featureset(kdf):
     # TODO: validity check for feature geometry
     from sparcgis.koalas import KoalasGeoAccessor
@@ -195,6 +286,71 @@ def test_to_featureset(kdf):
     assert fset.geometry_type is not None
 
 
+def test_features_from_columns():
+    xs = np.array([1.0, 2.0])
+    ys = np.array([3.0, 4.0])
+    attrs = {
+        "names": np.array(["a", "b"], dtype=object),
+        "ints": np.array([5, 6]),
+        "dates": np.array(["2020-01-01", "NaT"], dtype="datetime64[ns]"),
+    }
+    sr = {"wkid": 4326}
+
+    xy = sparcgis.koalas._pack_coordinates(xs, ys)
+    assert xy.shape == (2, 2)
+
+    features = sparcgis.koalas._features_from_columns(
+        xy, sr, attrs, ["names", "ints", "dates"]
+    )
+    assert len(features) == 2
+    assert features[0]["SHAPE"] == {"x": 1.0, "y": 3.0, "spatialReference": sr}
+    assert features[1]["attributes"]["names"] == "b"
+    assert features[1]["attributes"]["ints"] == 6
+    assert isinstance(features[1]["attributes"]["ints"], int)
+    # dates are boxed like pandas' to_dict("records") - Timestamps, with NaT for missing
+    assert features[0]["attributes"]["dates"] == pd.Timestamp("2020-01-01")
+    assert isinstance(features[0]["attributes"]["dates"], pd.Timestamp)
+    assert features[1]["attributes"]["dates"] is pd.NaT
+
+
+def test_to_json(kdf):
+    import json
+    from sparcgis.koalas import KoalasGeoAccessor
+
+    kdf.spatial.sr().geometry(Point)
+    d = json.loads(kdf.spatial.to_json())
+    assert d["geometryType"] == "esriGeometryPoint"
+    assert len(d["features"]) == len(kdf)
+    assert d["features"][0]["attributes"]["names"] == "geography"
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_to_json_dates(comprehensive_kdf, monkeypatch, use_orjson):
+    import json
+    from sparcgis.koalas import KoalasGeoAccessor
+
+    if use_orjson:
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(sparcgis.koalas, "orjson", None)
+
+    pdf = comprehensive_kdf.to_pandas()
+    pdf["x"] = np.random.uniform(-180, 180, len(pdf))
+    pdf["y"] = np.random.uniform(-90, 90, len(pdf))
+    pdf.loc[0, "datetime64"] = pd.NaT
+    kdf = ks.DataFrame(pdf)
+
+    features = json.loads(kdf.spatial.geometry(Point).to_json())["features"]
+    # esri dates are epoch milliseconds, missing dates are null
+    assert features[0]["attributes"]["datetime64"] is None
+    assert features[1]["attributes"]["datetime64"] == (
+        pd.Timestamp(pdf.loc[1, "datetime64"]).value // 10 ** 6
+    )
+    assert features[1]["attributes"]["timestamp"] == (
+        pd.Timestamp(pdf.loc[1, "timestamp"]).value // 10 ** 6
+    )
+
+
 def test_to_featurelayer():
     pass
 